@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from pasteld_mock_server import PasteldMockServer, SyntheticPastelChain, load_recorded_responses_func
+
+# Repeatable benchmarks for the hot paths in pastelrpc.py, run against a local pasteld_mock_server instance
+# (or a real node via --url). Results can be saved with --output and compared on later runs with --baseline;
+# any benchmark whose median got slower by more than --regression-threshold is reported and the exit code is 1.
+#
+# python benchmark_pastelrpc.py --latency-ms 1 --output baseline.json
+# python benchmark_pastelrpc.py --latency-ms 1 --baseline baseline.json
+# python benchmark_pastelrpc.py --per-call-latency-ms 1 --nodes 3 --workers 12 # reads spread over 3 mock nodes
+
+
+def run_benchmark_func(benchmark_name, function, number_of_items, repeat=5, warmup=1):
+    for _ in range(warmup):
+        function()
+    list_of_durations = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        list_of_durations.append(time.perf_counter() - start_time)
+    median_duration = statistics.median(list_of_durations)
+    return {'name': benchmark_name, 'items': number_of_items, 'repeat': repeat,
+            'median_seconds': median_duration, 'min_seconds': min(list_of_durations), 'max_seconds': max(list_of_durations),
+            'items_per_second': number_of_items / median_duration if median_duration > 0 else float('inf')}
+
+
+def get_benchmarks_func(pastelrpc, number_of_calls, max_workers=4):
+    rpc_connection = pastelrpc.rpc_connection
+    block_count = rpc_connection.getblockcount()
+    list_of_heights = list(range(max(block_count - number_of_calls + 1, 0), block_count + 1))
+    list_of_block_hashes = rpc_connection.batch_([['getblockhash', x] for x in list_of_heights])
+    list_of_ticket_txids = sorted(set(x['txid'] for x in pastelrpc.get_tickets_list_rpc_response_func('nft')))
+
+    def single_getblockhash_calls():
+        for current_height in list_of_heights:
+            rpc_connection.getblockhash(current_height)
+
+    def batched_getblockhash_calls():
+        rpc_connection.batch_([['getblockhash', x] for x in list_of_heights])
+
+    def single_getblock_calls():
+        for current_block_hash in list_of_block_hashes:
+            rpc_connection.getblock(current_block_hash)
+
+    def batched_getblock_calls():
+        rpc_connection.batch_([['getblock', x] for x in list_of_block_hashes])
+
+    def block_range_scan():
+        for _ in pastelrpc.BlockRangeScanner(max_batches_in_flight=max_workers).iterate_blocks(list_of_heights[0], list_of_heights[-1]):
+            pass
+
+    def all_tickets_pull():
+        pastelrpc.get_all_pastel_blockchain_tickets_func()
+
+    def supernode_list_build():
+        pastelrpc.check_supernode_list_func()
+
+    def burn_scan_core():
+        sum(pastelrpc.get_total_multisig_burn_amount_func(x) for _, x in pastelrpc.iterate_raw_transactions_in_batches_func(list_of_ticket_txids, max_workers=max_workers))
+
+    number_of_tickets = sum(len(pastelrpc.get_tickets_list_rpc_response_func(x)) for x in pastelrpc.LIST_OF_PASTEL_TICKET_TYPES)
+    return [('getblockhash_single', single_getblockhash_calls, len(list_of_heights)),
+            ('getblockhash_batch', batched_getblockhash_calls, len(list_of_heights)),
+            ('getblock_single', single_getblock_calls, len(list_of_block_hashes)),
+            ('getblock_batch', batched_getblock_calls, len(list_of_block_hashes)),
+            ('block_range_scan', block_range_scan, len(list_of_heights)),
+            ('all_tickets_pull', all_tickets_pull, number_of_tickets),
+            ('supernode_list_build', supernode_list_build, len(rpc_connection.masternodelist('rank'))),
+            ('burn_scan_core', burn_scan_core, len(list_of_ticket_txids))]
+
+
+def compare_to_baseline_func(list_of_results, baseline_file_path, regression_threshold):
+    with open(baseline_file_path, 'r') as f:
+        baseline_results = {x['name']: x for x in json.load(f)['results']}
+    list_of_regressions = []
+    for current_result in list_of_results:
+        baseline_result = baseline_results.get(current_result['name'])
+        if baseline_result is None:
+            continue
+        ratio = current_result['median_seconds'] / baseline_result['median_seconds']
+        current_result['baseline_ratio'] = ratio
+        if ratio > 1 + regression_threshold:
+            list_of_regressions.append(current_result['name'])
+    return list_of_regressions
+
+
+def print_results_func(list_of_results):
+    print('{:<24}{:>10}{:>14}{:>14}{:>16}{:>12}'.format('benchmark', 'items', 'median ms', 'min ms', 'items/second', 'vs base'))
+    for x in list_of_results:
+        ratio_string = '{:.2f}x'.format(x['baseline_ratio']) if 'baseline_ratio' in x else ''
+        print('{:<24}{:>10}{:>14.2f}{:>14.2f}{:>16.1f}{:>12}'.format(x['name'], x['items'], x['median_seconds'] * 1000, x['min_seconds'] * 1000, x['items_per_second'], ratio_string))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark pastelrpc.py against a local pasteld stand-in')
+    parser.add_argument('--url', help='benchmark an existing node instead of starting the mock server')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated network round-trip per HTTP request')
+    parser.add_argument('--per-call-latency-ms', type=float, default=0.0, help='simulated node work per call')
+    parser.add_argument('--blocks', type=int, default=2000)
+    parser.add_argument('--tickets-per-type', type=int, default=500)
+    parser.add_argument('--supernodes', type=int, default=100)
+    parser.add_argument('--nodes', type=int, default=1, help='mock nodes serving the same chain; more than one benchmarks LoadBalancedServiceProxy')
+    parser.add_argument('--rpc-threads', type=int, default=4, help='requests each mock node works on at once')
+    parser.add_argument('--workers', type=int, default=4, help='max_workers for the concurrent benchmarks')
+    parser.add_argument('--recordings', help='recorded responses for the mock server')
+    parser.add_argument('--calls', type=int, default=200, help='calls per single/batch benchmark')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--use-response-cache', action='store_true', help='turn rpc_response_cache on (repeats are then mostly cache hits)')
+    parser.add_argument('--raw-transaction-store', help='SQLite file for raw_transaction_store; without it transactions always come over RPC')
+    parser.add_argument('--benchmarks', help='comma-separated subset of benchmark names')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='JSON results from an earlier run to compare against')
+    parser.add_argument('--regression-threshold', type=float, default=0.2, help='allowed slowdown of the median before failing')
+    args = parser.parse_args()
+
+    list_of_mock_servers = []
+    if args.url:
+        os.environ['PASTELRPC_URL'] = args.url
+    else:
+        chain = SyntheticPastelChain(number_of_blocks=args.blocks, tickets_per_type=args.tickets_per_type, number_of_supernodes=args.supernodes)
+        recorded_responses = load_recorded_responses_func(args.recordings) if args.recordings else None
+        for _ in range(args.nodes):
+            list_of_mock_servers.append(PasteldMockServer(chain=chain, recorded_responses=recorded_responses, rpc_user='rpc_user', rpc_password='rpc_pwd',
+                                                          request_latency_seconds=args.latency_ms / 1000.0, per_call_latency_seconds=args.per_call_latency_ms / 1000.0,
+                                                          rpc_threads=args.rpc_threads).start_in_background())
+        os.environ['PASTELRPC_URL'] = ','.join(x.service_url for x in list_of_mock_servers)
+    import pastelrpc # rpc_connection is built from PASTELRPC_URL on first use
+    if args.use_response_cache:
+        pastelrpc.set_rpc_response_cache_func()
+    pastelrpc.raw_transaction_store = pastelrpc.RawTransactionStore(args.raw_transaction_store, min_confirmations=0) if args.raw_transaction_store else None
+
+    list_of_benchmarks = get_benchmarks_func(pastelrpc, args.calls, args.workers)
+    if args.benchmarks:
+        list_of_selected_names = args.benchmarks.split(',')
+        list_of_benchmarks = [x for x in list_of_benchmarks if x[0] in list_of_selected_names]
+    list_of_results = [run_benchmark_func(name, function, number_of_items, repeat=args.repeat) for name, function, number_of_items in list_of_benchmarks]
+    list_of_regressions = compare_to_baseline_func(list_of_results, args.baseline, args.regression_threshold) if args.baseline else []
+    print_results_func(list_of_results)
+    for mock_server in list_of_mock_servers:
+        mock_server.stop()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'settings': vars(args), 'results': list_of_results}, f, indent=2)
+    if list_of_regressions:
+        print('Regressions beyond {:.0%}: {}'.format(args.regression_threshold, ', '.join(list_of_regressions)))
+        sys.exit(1)
@@ -3,52 +3,98 @@ from tqdm import tqdm
 
 
 use_testnet=1
+transaction_batch_size = 250 # txids per batch_ request
+max_concurrent_batches = 4 # batches in flight at once; keep low enough not to starve pasteld's RPC threads
+checkpoint_file_path = 'burned_coins_scan_checkpoint.json'
+ticket_store_file_path = 'pastel_tickets.sqlite' # shared with other ticket analytics jobs
+raw_transaction_store_file_path = 'pastel_raw_transactions.sqlite' # confirmed transactions already fetched by earlier runs
+reorg_safety_depth = 10 # blocks re-examined on every run in case the tip was reorganized
+save_checkpoint_every_n_txids = 5000
+rollback_to_block_height = None # set to a height to discard everything above it before scanning (e.g. after a deep reorg)
 if use_testnet:
-    burn_address = 'tPpasteLBurnAddressXXXXXXXXXXX3wy7u' 
+    burn_address = 'tPpasteLBurnAddressXXXXXXXXXXX3wy7u'
     url_string = f'https://explorer-testnet-api.pastel.network/v1/addresses/{burn_address}'
 else:
     burn_address = 'PtpasteLBurnAddressXXXXXXXXXXbJ5ndd'
     url_string = f'https://explorer-api.pastel.network/v1/addresses/{burn_address}'
-    
+
+
+def load_burn_checkpoint_func(file_path):
+    # txid_to_height_and_burn_amount_dict maps txid -> [ticket block height, multisig burn amount]
+    if not os.path.exists(file_path):
+        return {'last_processed_block_height': -1, 'txid_to_height_and_burn_amount_dict': {}}
+    with open(file_path, 'r') as f:
+        checkpoint = json.load(f)
+    checkpoint['txid_to_height_and_burn_amount_dict'] = {txid: [height, decimal.Decimal(amount)] for txid, (height, amount) in checkpoint['txid_to_height_and_burn_amount_dict'].items()}
+    return checkpoint
+
+
+def save_burn_checkpoint_func(checkpoint, file_path):
+    serializable_checkpoint = {'last_processed_block_height': checkpoint['last_processed_block_height'],
+                               'txid_to_height_and_burn_amount_dict': {txid: [height, str(amount)] for txid, (height, amount) in checkpoint['txid_to_height_and_burn_amount_dict'].items()}}
+    temp_file_path = file_path + '.tmp'
+    with open(temp_file_path, 'w') as f:
+        json.dump(serializable_checkpoint, f)
+    os.replace(temp_file_path, file_path) # atomic, so an interrupted run never leaves a truncated checkpoint
+
+
+def rollback_burn_checkpoint_func(checkpoint, block_height):
+    txid_to_height_and_burn_amount_dict = checkpoint['txid_to_height_and_burn_amount_dict']
+    list_of_txids_to_discard = [txid for txid, (height, _) in txid_to_height_and_burn_amount_dict.items() if height > block_height]
+    for txid in list_of_txids_to_discard:
+        del txid_to_height_and_burn_amount_dict[txid]
+    checkpoint['last_processed_block_height'] = min(checkpoint['last_processed_block_height'], block_height)
+    return len(list_of_txids_to_discard)
+
+
 response = requests.get(url_string)
 address_data_dict = response.json()
 burn_address_balance = float(address_data_dict['incomingSum'])
 print('Burn address balance: {}'.format(burn_address_balance))
 
-tickets_obj = get_all_pastel_blockchain_tickets_func(verbose=1)
-list_of_table_names = list(tickets_obj.keys())
-
-for idx, current_table_name in enumerate(list_of_table_names):
-    current_table = tickets_obj[current_table_name]
-    current_table_txids = current_table['txid'].tolist()
-    if idx == 0:
-        all_txids = current_table_txids
-    else:
-        all_txids = all_txids + current_table_txids
-list_of_all_ticket_txids = list(set(all_txids))
-list_of_all_ticket_txids.sort()
-print('Number of unique ticket txids: {}'.format(len(list_of_all_ticket_txids)))
-
-txid_to_total_burn_amount_dict = {}
-pbar = tqdm()
-for idx, current_txid in enumerate(list_of_all_ticket_txids):
-    pbar.set_description('Processing txid: {}'.format(current_txid))
-    current_raw_transaction_data = get_raw_transaction_func(current_txid)
-    current_vout_data = current_raw_transaction_data['vout']
-    total_burn_amount_for_current_txid = decimal.Decimal(0.0)
-    for current_vout in current_vout_data:
-        vout_type = ''
-        if 'scriptPubKey' in current_vout:
-            if 'type' in current_vout['scriptPubKey']:
-                vout_type = current_vout['scriptPubKey']['type']
-        if vout_type == 'multisig':
-            current_vout_amount = current_vout['value']
-            total_burn_amount_for_current_txid += current_vout_amount
-    txid_to_total_burn_amount_dict[current_txid] = total_burn_amount_for_current_txid
+ticket_store = PastelTicketStore(ticket_store_file_path, reorg_safety_depth=reorg_safety_depth)
+set_raw_transaction_store_func(raw_transaction_store_file_path)
+set_rpc_response_cache_func() # blocks and transactions are read repeatedly, and a tip up to a second old is fine here
+checkpoint = load_burn_checkpoint_func(checkpoint_file_path)
+txid_to_height_and_burn_amount_dict = checkpoint['txid_to_height_and_burn_amount_dict']
+print('Loaded checkpoint with {} txids up to block {}'.format(len(txid_to_height_and_burn_amount_dict), checkpoint['last_processed_block_height']))
+if rollback_to_block_height is not None:
+    number_of_discarded_txids = rollback_burn_checkpoint_func(checkpoint, rollback_to_block_height)
+    ticket_store.rollback(rollback_to_block_height)
+    print('Rolled back to block {}, discarded {} txids'.format(rollback_to_block_height, number_of_discarded_txids))
+if checkpoint['last_processed_block_height'] >= 0:
+    rollback_burn_checkpoint_func(checkpoint, checkpoint['last_processed_block_height'] - reorg_safety_depth)
+
+with MyTimer('sync ticket store'):
+    ticket_store.refresh(verbose=1)
+current_block_height = min(ticket_store.get_last_synced_height(x) for x in LIST_OF_PASTEL_TICKET_TYPES)
+min_block_height_to_scan = checkpoint['last_processed_block_height'] + 1
+print('Scanning tickets from block {} to {}'.format(min_block_height_to_scan, current_block_height))
+
+txid_to_ticket_height_dict = {}
+for _, list_of_ticket_records in ticket_store.iterate_all(columns=['txid', 'height'], min_height=min_block_height_to_scan, max_height=current_block_height):
+    for current_ticket_record in list_of_ticket_records:
+        if current_ticket_record['txid'] not in txid_to_height_and_burn_amount_dict:
+            txid_to_ticket_height_dict[current_ticket_record['txid']] = current_ticket_record['height']
+list_of_new_ticket_txids = sorted(txid_to_ticket_height_dict)
+print('Number of new unique ticket txids: {}'.format(len(list_of_new_ticket_txids)))
+
+pbar = tqdm(total=len(list_of_new_ticket_txids))
+scan_start_time = time.time()
+for idx, (current_txid, current_raw_transaction_data) in enumerate(iterate_raw_transactions_in_batches_func(list_of_new_ticket_txids, batch_size=transaction_batch_size, max_workers=max_concurrent_batches)):
+    txid_to_height_and_burn_amount_dict[current_txid] = [txid_to_ticket_height_dict[current_txid], get_total_multisig_burn_amount_func(current_raw_transaction_data)]
     pbar.update(1)
+    if (idx + 1) % save_checkpoint_every_n_txids == 0:
+        save_burn_checkpoint_func(checkpoint, checkpoint_file_path) # partial progress; last_processed_block_height is only advanced below
+pbar.close()
+scan_duration_in_seconds = max(time.time() - scan_start_time, 1e-9)
+print('Fetched {} txids at {:.1f} txids/second (batch size {}, {} concurrent batches)'.format(len(list_of_new_ticket_txids), len(list_of_new_ticket_txids) / scan_duration_in_seconds, transaction_batch_size, max_concurrent_batches))
 print('Done processing all txids!')
 
-total_burned_in_dust_transactions = sum(txid_to_total_burn_amount_dict.values())
+checkpoint['last_processed_block_height'] = current_block_height
+save_burn_checkpoint_func(checkpoint, checkpoint_file_path)
+
+total_burned_in_dust_transactions = sum(amount for _, amount in txid_to_height_and_burn_amount_dict.values())
 print('Total burned in dust transactions: {}'.format(total_burned_in_dust_transactions))
 total_burned_psl = float(total_burned_in_dust_transactions) + burn_address_balance
 print('Total burned psl: {}'.format(total_burned_psl))
@@ -0,0 +1,50 @@
+import decimal
+import json
+
+import pandas as pd
+import pytest
+
+from pastelrpc import (RPCResponseCache, RawTransactionStore, _decode_rpc_response_json_func,
+                       _get_utxos_df_from_listunspent_response_func, get_amounts_in_patoshis_func)
+
+RAW_TRANSACTION_JSON = '{"txid": "ab", "confirmations": 20, "vout": [{"value": 1.23456, "valuePat": 123456, "n": 0}, {"value": 0.00001, "valuePat": 1, "n": 1}]}'
+LISTUNSPENT_JSON = '[{"txid": "ab", "vout": 0, "address": "Ptaddr", "amount": 1.23456, "confirmations": 20, "spendable": true}, {"txid": "cd", "vout": 1, "address": "Ptaddr", "amount": 250000, "confirmations": 3, "spendable": true}]'
+
+
+@pytest.mark.parametrize('amount_mode', ['decimal', 'patoshis'])
+def test_listunspent_amounts_in_patoshis(amount_mode):
+    list_of_unspent_outputs = _decode_rpc_response_json_func(LISTUNSPENT_JSON, amount_mode)
+    utxos_df = _get_utxos_df_from_listunspent_response_func(list_of_unspent_outputs, 'transparent', amount_mode)
+    assert utxos_df['amount_in_patoshis'].tolist() == [123456, 25000000000]
+
+
+@pytest.mark.parametrize('amount_mode', ['decimal', 'patoshis'])
+def test_filled_float_amounts_in_patoshis(amount_mode):
+    list_of_amounts = [decimal.Decimal('-0.1'), None, decimal.Decimal('2')] if amount_mode == 'decimal' else [-10000, None, 200000]
+    amount_series = pd.DataFrame({'fee': list_of_amounts})['fee']
+    assert get_amounts_in_patoshis_func(amount_series.fillna(0), amount_mode).tolist() == [-10000, 0, 200000]
+
+
+def test_decimal_amounts_in_patoshis_are_exact():
+    amount_series = pd.Series([decimal.Decimal('123456789012.34567'), '-0.00001', 7, decimal.Decimal('1E+2'), decimal.Decimal('1.100000')], dtype=object)
+    assert get_amounts_in_patoshis_func(amount_series).tolist() == [12345678901234567, -1, 700000, 10000000, 110000]
+    assert get_amounts_in_patoshis_func(pd.Series([3, 4])).tolist() == [300000, 400000]
+    assert get_amounts_in_patoshis_func(pd.Series([3, 4]), 'patoshis').tolist() == [3, 4]
+
+
+def test_raw_transaction_store_round_trip_across_amount_modes(tmp_path):
+    store = RawTransactionStore(str(tmp_path / 'raw.sqlite'))
+    store.put_many([_decode_rpc_response_json_func(RAW_TRANSACTION_JSON, 'patoshis')], current_block_height=100, amount_mode='patoshis')
+    decimal_transaction = store.get('ab', 100)
+    assert [x['value'] for x in decimal_transaction['vout']] == [decimal.Decimal('1.23456'), decimal.Decimal('0.00001')]
+    patoshi_transaction = store.get('ab', 100, amount_mode='patoshis')
+    assert [x['value'] for x in patoshi_transaction['vout']] == [123456, 1]
+    assert [x['valuePat'] for x in patoshi_transaction['vout']] == [123456, 1]
+
+
+def test_response_cache_keeps_amount_modes_apart():
+    cache = RPCResponseCache()
+    cache.check_tip_(lambda: ('00ff', 100))
+    cache.store('getrawtransaction', ['ab', 1], json.loads(RAW_TRANSACTION_JSON, parse_float=decimal.Decimal), 100)
+    assert cache.lookup('getrawtransaction', ['ab', 1], 'patoshis') == (False, None)
+    assert cache.lookup('getrawtransaction', ['ab', 1])[0]